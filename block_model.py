@@ -1,27 +1,30 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Sequence
+from typing import Callable, Iterator, List, Sequence
 
 import config
-from design_constants import colors_for
+from latex_template import LATEX_SAMPLE
+from map_template import default_map_template
 from three_template import default_three_template
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TextBlock:
     text: str
     kind: str = "body"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ThreeBlock:
     source: str
     title: str = ""
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PythonImageBlock:
     source: str
     format: str = "svg"
@@ -34,29 +37,46 @@ class PythonImageBlock:
     last_error: str | None = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class LatexBlock:
     source: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class MapBlock:
     source: str
 
 
 Block = TextBlock | ThreeBlock | PythonImageBlock | LatexBlock | MapBlock
 
+# Heading kind -> level; the one table every module reads heading kinds from.
+HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
 
 class BlockDocument:
-    def __init__(self, blocks: Sequence[Block], path: Path | None = None) -> None:
-        self._blocks: List[Block] = list(blocks)
+    def __init__(
+        self, blocks: Sequence[Block], path: Path | None = None, copy: bool = True
+    ) -> None:
+        # copy=False hands a freshly built list over to the document as-is.
+        if copy or type(blocks) is not list:
+            blocks = list(blocks)
+        self._blocks: List[Block] = blocks
         self._path = path
         self._dirty = False
+        self._batch_depth = 0
+        self._toc_index = self._find_toc_index()
+        # Running max heading level (h1=1 .. h6=6) over blocks[: i + 1],
+        # extended lazily; edits cut it back to the first changed position.
+        self._heading_max: list[int] = []
 
     @property
     def blocks(self) -> List[Block]:
         return self._blocks
 
+    @property
+    def toc_index(self) -> int | None:
+        return self._toc_index
+
     @property
     def path(self) -> Path | None:
         return self._path
@@ -71,17 +91,47 @@ class BlockDocument:
     def clear_dirty(self) -> None:
         self._dirty = False
 
+    @property
+    def batching(self) -> bool:
+        return self._batch_depth > 0
+
+    @contextmanager
+    def batch(self, view=None) -> Iterator[BlockDocument]:
+        # Views skip TOC/numbering refreshes while batching; the outermost
+        # batch refreshes the given view once on exit.
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and view is not None:
+                view.refresh_outline(self)
+
     def append_block(self, block: Block) -> None:
         self._blocks.append(block)
+        self._track_inserted_toc(len(self._blocks) - 1, (block,))
         self._dirty = True
 
-    def insert_block_after(self, index: int, block: Block) -> None:
+    def insert_block_after(self, index: int, block: Block) -> int:
         if index < 0:
-            self._blocks.insert(0, block)
+            position = 0
         elif index >= len(self._blocks) - 1:
-            self._blocks.append(block)
+            position = len(self._blocks)
         else:
-            self._blocks.insert(index + 1, block)
+            position = index + 1
+        self._blocks.insert(position, block)
+        self._track_inserted_toc(position, (block,))
+        self._truncate_heading_max(position)
+        self._dirty = True
+        return position
+
+    def insert_blocks_after(self, index: int, blocks: Sequence[Block]) -> None:
+        if not blocks:
+            return
+        position = 0 if index < 0 else min(index + 1, len(self._blocks))
+        self._blocks[position:position] = blocks
+        self._track_inserted_toc(position, blocks)
+        self._truncate_heading_max(position)
         self._dirty = True
 
     def move_block(self, from_index: int, to_index: int) -> bool:
@@ -91,8 +141,24 @@ class BlockDocument:
             return False
         if from_index == to_index:
             return False
-        block = self._blocks.pop(from_index)
-        self._blocks.insert(to_index, block)
+        blocks = self._blocks
+        block = blocks[from_index]
+        if to_index - from_index in (1, -1):
+            # Adjacent moves (the j/k case) are a swap, not two list shifts.
+            blocks[from_index] = blocks[to_index]
+            blocks[to_index] = block
+        else:
+            del blocks[from_index]
+            blocks.insert(to_index, block)
+        toc_index = self._toc_index
+        if isinstance(block, TextBlock) and block.kind == "toc":
+            self._toc_index = self._find_toc_index()
+        elif toc_index is not None:
+            if from_index < toc_index <= to_index:
+                self._toc_index = toc_index - 1
+            elif to_index <= toc_index < from_index:
+                self._toc_index = toc_index + 1
+        self._truncate_heading_max(min(from_index, to_index))
         self._dirty = True
         return True
 
@@ -100,60 +166,67 @@ class BlockDocument:
         if index < 0 or index >= len(self._blocks):
             return None
         block = self._blocks.pop(index)
+        if self._toc_index is not None:
+            if index == self._toc_index:
+                self._toc_index = self._find_toc_index()
+            elif index < self._toc_index:
+                self._toc_index -= 1
+        self._truncate_heading_max(index)
         self._dirty = True
         return block
 
-    def remove_text_blocks_by_kind(self, kind: str) -> None:
-        original_len = len(self._blocks)
-        self._blocks = [
-            block
-            for block in self._blocks
-            if not (isinstance(block, TextBlock) and block.kind == kind)
-        ]
-        if len(self._blocks) != original_len:
-            self._dirty = True
-
-    def set_text_block(self, index: int, text: str) -> None:
-        if index < 0 or index >= len(self._blocks):
-            return
-        block = self._blocks[index]
-        if isinstance(block, TextBlock):
-            self._blocks[index] = TextBlock(text, kind=block.kind)
-            self._dirty = True
+    def remove_range(self, start: int, end: int) -> List[Block]:
+        start = max(start, 0)
+        end = min(end, len(self._blocks) - 1)
+        if start > end:
+            return []
+        removed = self._blocks[start : end + 1]
+        del self._blocks[start : end + 1]
+        if self._toc_index is not None:
+            if start <= self._toc_index <= end:
+                self._toc_index = self._find_toc_index()
+            elif self._toc_index > end:
+                self._toc_index -= len(removed)
+        self._truncate_heading_max(start)
+        self._dirty = True
+        return removed
+
+    def max_heading_level_through(self, index: int) -> int:
+        if index < 0 or not self._blocks:
+            return 0
+        index = min(index, len(self._blocks) - 1)
+        heading_max = self._heading_max
+        if index >= len(heading_max):
+            running = heading_max[-1] if heading_max else 0
+            for block in self._blocks[len(heading_max) : index + 1]:
+                if isinstance(block, TextBlock):
+                    running = max(running, HEADING_LEVELS.get(block.kind, 0))
+                heading_max.append(running)
+        return heading_max[index]
+
+    def _truncate_heading_max(self, position: int) -> None:
+        del self._heading_max[max(position, 0) :]
+
+    def set_text_block(self, index: int, text: str) -> bool:
+        return self._set_source(index, TextBlock, text)
 
     def set_text_block_kind(self, index: int, kind: str) -> None:
-        if index < 0 or index >= len(self._blocks):
+        blocks = self._blocks
+        if not 0 <= index < len(blocks):
             return
-        block = self._blocks[index]
+        block = blocks[index]
         if isinstance(block, TextBlock):
-            self._blocks[index] = TextBlock(block.text, kind=kind)
+            blocks[index] = TextBlock(block.text, kind=kind)
+            if "toc" in (block.kind, kind):
+                self._toc_index = self._find_toc_index()
+            self._truncate_heading_max(index)
             self._dirty = True
 
-    def set_three_block(self, index: int, source: str) -> None:
-        if index < 0 or index >= len(self._blocks):
-            return
-        block = self._blocks[index]
-        if isinstance(block, ThreeBlock):
-            self._blocks[index] = ThreeBlock(source, title=block.title)
-            self._dirty = True
+    def set_three_block(self, index: int, source: str) -> bool:
+        return self._set_source(index, ThreeBlock, source)
 
-    def set_python_image_block(self, index: int, source: str) -> None:
-        if index < 0 or index >= len(self._blocks):
-            return
-        block = self._blocks[index]
-        if isinstance(block, PythonImageBlock):
-            self._blocks[index] = PythonImageBlock(
-                source,
-                format=block.format,
-                rendered_data_dark=None,
-                rendered_hash_dark=None,
-                rendered_path_dark=None,
-                rendered_data_light=None,
-                rendered_hash_light=None,
-                rendered_path_light=None,
-                last_error=None,
-            )
-            self._dirty = True
+    def set_python_image_block(self, index: int, source: str) -> bool:
+        return self._set_source(index, PythonImageBlock, source)
 
     def set_python_image_render(
         self,
@@ -164,13 +237,13 @@ class BlockDocument:
         rendered_hash_light: str | None,
         last_error: str | None,
     ) -> None:
-        if index < 0 or index >= len(self._blocks):
+        blocks = self._blocks
+        if not 0 <= index < len(blocks):
             return
-        block = self._blocks[index]
+        block = blocks[index]
         if isinstance(block, PythonImageBlock):
-            self._blocks[index] = PythonImageBlock(
-                block.source,
-                format=block.format,
+            blocks[index] = replace(
+                block,
                 rendered_data_dark=rendered_data_dark,
                 rendered_hash_dark=rendered_hash_dark,
                 rendered_path_dark=None,
@@ -181,26 +254,63 @@ class BlockDocument:
             )
             self._dirty = True
 
-    def set_map_block(self, index: int, source: str) -> None:
-        if index < 0 or index >= len(self._blocks):
-            return
-        block = self._blocks[index]
-        if isinstance(block, MapBlock):
-            self._blocks[index] = MapBlock(source)
-            self._dirty = True
+    def set_map_block(self, index: int, source: str) -> bool:
+        return self._set_source(index, MapBlock, source)
 
-    def set_latex_block(self, index: int, source: str) -> None:
-        if index < 0 or index >= len(self._blocks):
-            return
-        block = self._blocks[index]
-        if isinstance(block, LatexBlock):
-            self._blocks[index] = LatexBlock(source)
-            self._dirty = True
+    def set_latex_block(self, index: int, source: str) -> bool:
+        return self._set_source(index, LatexBlock, source)
+
+    def _set_source(self, index: int, block_type: type, value: str) -> bool:
+        blocks = self._blocks
+        if not 0 <= index < len(blocks):
+            return False
+        block = blocks[index]
+        if type(block) is not block_type:
+            return False
+        current = block.text if block_type is TextBlock else block.source
+        if current == value:
+            return False
+        blocks[index] = _SOURCE_REPLACERS[block_type](block, value)
+        self._dirty = True
+        return True
+
+    def _find_toc_index(self) -> int | None:
+        for index, block in enumerate(self._blocks):
+            if isinstance(block, TextBlock) and block.kind == "toc":
+                return index
+        return None
+
+    def _track_inserted_toc(self, position: int, blocks: Sequence[Block]) -> None:
+        if self._toc_index is not None and position <= self._toc_index:
+            self._toc_index += len(blocks)
+        for offset, block in enumerate(blocks):
+            if isinstance(block, TextBlock) and block.kind == "toc":
+                if self._toc_index is None or position + offset < self._toc_index:
+                    self._toc_index = position + offset
+                break
+
+
+# Block type -> builder for a copy of the block with new text/source. A new
+# pyimage source drops every cached render.
+_SOURCE_REPLACERS: dict[type, Callable[[Block, str], Block]] = {
+    TextBlock: lambda block, text: TextBlock(text, kind=block.kind),
+    ThreeBlock: lambda block, source: ThreeBlock(source, title=block.title),
+    PythonImageBlock: lambda block, source: PythonImageBlock(
+        source, format=block.format
+    ),
+    LatexBlock: lambda block, source: LatexBlock(source),
+    MapBlock: lambda block, source: MapBlock(source),
+}
 
 
 def sample_document() -> BlockDocument:
-    palette = colors_for(config.get_ui_mode() or "dark")
-    blocks: List[Block] = [
+    return BlockDocument(_sample_blocks(config.get_ui_mode() or "dark"))
+
+
+@lru_cache(maxsize=4)
+def _sample_blocks(ui_mode: str) -> tuple[Block, ...]:
+    # Blocks are immutable, so every sample document can share them.
+    return (
         TextBlock(
             "Documentation Title",
             kind="title",
@@ -209,133 +319,107 @@ def sample_document() -> BlockDocument:
             "",
             kind="toc",
         ),
-    ]
-
-    blocks.extend(
-        [
-            TextBlock(
-                "Navigation",
-                kind="h1",
-            ),
-            TextBlock(
-                "Use j/k to move between blocks.\n"
-                "Press Enter to edit the selected block in Vim.\n"
-                "Exit Vim to refresh the block content.\n"
-                "Press ? to show the shortcuts panel.",
-                kind="body",
-            ),
-            TextBlock(
-                "Heading 1",
-                kind="h1",
-            ),
-            TextBlock(
-                "Heading 1 is for top-level sections.\n"
-                "Use it to structure the document into major parts.",
-                kind="body",
-            ),
-            TextBlock(
-                "Heading 2",
-                kind="h2",
-            ),
-            TextBlock(
-                "You can structure documents with three heading levels.\n"
-                "Use ,bh1, ,bh2, and ,bh3 for hierarchy.",
-                kind="body",
-            ),
-            TextBlock(
-                "Heading 3",
-                kind="h3",
-            ),
-            TextBlock(
-                "Heading 3 is useful for fine-grained sections.\n"
-                "Use it sparingly for subtopics.",
-                kind="body",
-            ),
-            TextBlock(
-                "Three.js blocks",
-                kind="h1",
-            ),
-            TextBlock(
-                "Three.js blocks are JS modules with THREE, scene, camera,\n"
-                "renderer, and canvas pre-wired.\n"
-                "Use them for real-time 3D scenes.",
-                kind="body",
-            ),
-            ThreeBlock(
-                default_three_template(
-                    config.get_ui_mode() or "dark", include_guidance=False
-                )
-            ),
-            TextBlock(
-                "LaTeX blocks",
-                kind="h1",
-            ),
-            TextBlock(
-                "LaTeX blocks render with KaTeX in a WebKit view.\n"
-                "Edit the LaTeX source directly.",
-                kind="body",
-            ),
-            LatexBlock(r"\int_0^\infty e^{-x^2} dx = \frac{\sqrt{\pi}}{2}"),
-            TextBlock(
-                "Map blocks",
-                kind="h1",
-            ),
-            TextBlock(
-                "Map blocks run Leaflet JS with L, map, and tileLayer globals.\n"
-                "Use them to plot points, shapes, and paths on a dark basemap.",
-                kind="body",
-            ),
-            MapBlock(
-                "// Leaflet globals: L, map, tileLayer\n"
-                "const points = [\n"
-                "  [40.7484, -73.9857],\n"
-                "  [51.5072, -0.1276],\n"
-                "  [48.8566, 2.3522],\n"
-                "];\n"
-                "points.forEach(([lat, lon]) => {\n"
-                "  L.circleMarker([lat, lon], {\n"
-                "    radius: 5,\n"
-                f"    color: '{palette.map_marker}',\n"
-                f"    fillColor: '{palette.map_marker}',\n"
-                "    fillOpacity: 0.9,\n"
-                "  }).addTo(map);\n"
-                "});\n"
-                "const bounds = L.latLngBounds(points);\n"
-                "map.fitBounds(bounds.pad(0.2));\n"
-            ),
-            TextBlock(
-                "Python render blocks",
-                kind="h1",
-            ),
-            TextBlock(
-                "Python blocks render to SVG via __gvim__.renderer.\n"
-                "They are rendered at runtime for export.",
-                kind="body",
-            ),
-            PythonImageBlock(
-                "import numpy as np\n"
-                "plot_func(\n"
-                "    x=np.linspace(-5, 5, 100),\n"
-                "    y1=lambda x: 0.5 * x + 1,\n"
-                "    y2=lambda x: 0.3 * x + 2,\n"
-                '    title="My Plot"\n'
-                ")\n",
-                format="svg",
-            ),
-            TextBlock(
-                "Notes",
-                kind="h3",
-            ),
-            TextBlock(
-                "- No inline mixing; each block is its own unit.\n"
-                "- Vim runs externally; GTK stays focused on layout.",
-                kind="body",
-            ),
-        ]
+        TextBlock(
+            "Navigation",
+            kind="h1",
+        ),
+        TextBlock(
+            "Use j/k to move between blocks.\n"
+            "Press Enter to edit the selected block in Vim.\n"
+            "Exit Vim to refresh the block content.\n"
+            "Press ? to show the shortcuts panel.",
+            kind="body",
+        ),
+        TextBlock(
+            "Heading 1",
+            kind="h1",
+        ),
+        TextBlock(
+            "Heading 1 is for top-level sections.\n"
+            "Use it to structure the document into major parts.",
+            kind="body",
+        ),
+        TextBlock(
+            "Heading 2",
+            kind="h2",
+        ),
+        TextBlock(
+            "You can structure documents with three heading levels.\n"
+            "Use ,bh1, ,bh2, and ,bh3 for hierarchy.",
+            kind="body",
+        ),
+        TextBlock(
+            "Heading 3",
+            kind="h3",
+        ),
+        TextBlock(
+            "Heading 3 is useful for fine-grained sections.\n"
+            "Use it sparingly for subtopics.",
+            kind="body",
+        ),
+        TextBlock(
+            "Three.js blocks",
+            kind="h1",
+        ),
+        TextBlock(
+            "Three.js blocks are JS modules with THREE, scene, camera,\n"
+            "renderer, and canvas pre-wired.\n"
+            "Use them for real-time 3D scenes.",
+            kind="body",
+        ),
+        ThreeBlock(
+            default_three_template(ui_mode, include_guidance=False)
+        ),
+        TextBlock(
+            "LaTeX blocks",
+            kind="h1",
+        ),
+        TextBlock(
+            "LaTeX blocks render with KaTeX in a WebKit view.\n"
+            "Edit the LaTeX source directly.",
+            kind="body",
+        ),
+        LatexBlock(LATEX_SAMPLE),
+        TextBlock(
+            "Map blocks",
+            kind="h1",
+        ),
+        TextBlock(
+            "Map blocks run Leaflet JS with L, map, and tileLayer globals.\n"
+            "Use them to plot points, shapes, and paths on a dark basemap.",
+            kind="body",
+        ),
+        MapBlock(default_map_template(ui_mode)),
+        TextBlock(
+            "Python render blocks",
+            kind="h1",
+        ),
+        TextBlock(
+            "Python blocks render to SVG via __gvim__.renderer.\n"
+            "They are rendered at runtime for export.",
+            kind="body",
+        ),
+        PythonImageBlock(
+            "import numpy as np\n"
+            "plot_func(\n"
+            "    x=np.linspace(-5, 5, 100),\n"
+            "    y1=lambda x: 0.5 * x + 1,\n"
+            "    y2=lambda x: 0.3 * x + 2,\n"
+            '    title="My Plot"\n'
+            ")\n",
+            format="svg",
+        ),
+        TextBlock(
+            "Notes",
+            kind="h3",
+        ),
+        TextBlock(
+            "- No inline mixing; each block is its own unit.\n"
+            "- Vim runs externally; GTK stays focused on layout.",
+            kind="body",
+        ),
     )
 
-    return BlockDocument(blocks)
-
 
 def get_document_title(document: BlockDocument) -> str | None:
     for block in document.blocks:
@@ -352,11 +436,10 @@ def build_heading_numbering(
 ) -> dict[int, str]:
     counters = [0, 0, 0, 0, 0, 0]
     numbering: dict[int, str] = {}
-    levels = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
     for index, block in enumerate(blocks):
         if not isinstance(block, TextBlock):
             continue
-        level = levels.get(block.kind)
+        level = HEADING_LEVELS.get(block.kind)
         if level is None:
             continue
         counters[level - 1] += 1
@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
 
 from block_model import LatexBlock, MapBlock, PythonImageBlock, TextBlock, ThreeBlock
 
@@ -26,7 +27,12 @@ _BLOCK_CAPABILITIES: dict[type, BlockCapabilities] = {
 
 
 def get_block_capabilities(block: object) -> BlockCapabilities | None:
-    for block_type, capabilities in _BLOCK_CAPABILITIES.items():
-        if isinstance(block, block_type):
+    return _capabilities_for_type(type(block))
+
+
+@lru_cache(maxsize=None)
+def _capabilities_for_type(block_type: type) -> BlockCapabilities | None:
+    for registered_type, capabilities in _BLOCK_CAPABILITIES.items():
+        if issubclass(block_type, registered_type):
             return capabilities
     return None
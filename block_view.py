@@ -2,9 +2,15 @@ from __future__ import annotations
 
 import hashlib
 import os
+import queue
 import shutil
+import threading
+import traceback
+import weakref
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Sequence
+from functools import lru_cache
+from typing import Callable, Sequence
 from pathlib import Path
 
 import gi
@@ -28,6 +34,8 @@ except Exception:
 import document_io
 import keymap
 from block_model import (
+    HEADING_LEVELS,
+    Block,
     BlockDocument,
     LatexBlock,
     MapBlock,
@@ -43,6 +51,13 @@ from map_template import render_map_html
 from three_template import render_three_html
 
 
+_HEADING_KINDS = frozenset(HEADING_LEVELS)
+_TOC_INDENTS = {kind: "  " * (level - 1) for kind, level in HEADING_LEVELS.items()}
+# Text kind -> (top margin, bottom margin, pixels above, pixels below lines).
+_BODY_TEXT_SPACING = (12, 12, 0, 0)
+_TEXT_SPACING = {kind: (10, 8, 1, 1) for kind in _HEADING_KINDS | {"title"}}
+
+
 @dataclass
 class OutlineEntry:
     block_index: int
@@ -74,9 +89,7 @@ class VaultAction:
 class _TocBlockView(Gtk.Frame):
     def __init__(self, text: str) -> None:
         super().__init__()
-        self.add_css_class("block")
-        self.add_css_class("block-text")
-        self.add_css_class("block-text-toc")
+        self.set_css_classes(["block", "block-text", "block-text-toc"])
 
         box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
         box.set_hexpand(True)
@@ -140,6 +153,8 @@ class BlockEditorView(Gtk.Box):
         self._visual_active = False
         self._visual_anchor = 0
         self._visual_end = 0
+        # Widget -> selection CSS classes it currently carries.
+        self._selection_classes: dict[Gtk.Widget, tuple[str, ...]] = {}
 
         self._column = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=0)
         self._column.set_margin_top(24)
@@ -190,9 +205,16 @@ class BlockEditorView(Gtk.Box):
         self._vault_locked = False
 
         self._status_timer_id: int | None = None
-        self._scroll_idle_id: int | None = None
+        self._status_deadline_ms = 0
+        self._scroll_pending = False
         self._scroll_retries = 0
+        self._webview_pending = False
+        self._webview_retries = 0
         self._scroller.set_child(self._column)
+        vadjustment = self._scroller.get_vadjustment()
+        if vadjustment is not None:
+            vadjustment.connect("value-changed", self._on_blocks_viewport_changed)
+            vadjustment.connect("changed", self._on_blocks_viewport_changed)
 
         self._overlay = Gtk.Overlay()
         self._overlay.set_hexpand(True)
@@ -218,31 +240,92 @@ class BlockEditorView(Gtk.Box):
         self.append(self._overlay)
 
         self._document: BlockDocument | None = None
+        self._widgets_ui_mode: str | None = None
+        # The block each entry of _block_widgets currently shows, kept in step
+        # with it so set_document never pairs a widget with a mutated list.
+        self._widget_blocks: list[Block | None] = []
 
     def set_document(self, document: BlockDocument) -> None:
+        # A widget is reused for a block equal to the one it last showed
+        # (blocks are frozen and compare by value) as long as the UI mode is
+        # unchanged; everything else is rebuilt.
+        reusable: dict[object, list[Gtk.Widget]] = {}
+        if self._widgets_ui_mode == self._ui_mode:
+            for block, widget in zip(self._widget_blocks, self._block_widgets):
+                reusable.setdefault(block, []).append(widget)
+        for widget, classes in self._selection_classes.items():
+            for name in classes:
+                widget.remove_css_class(name)
+        self._selection_classes = {}
         self._document = document
-        for child in list(self._column):
-            self._column.remove(child)
-
-        self._block_widgets = []
+        self._widgets_ui_mode = self._ui_mode
 
         numbering = build_heading_numbering(document.blocks)
-        toc_text = _build_toc(
-            [block for block in document.blocks if isinstance(block, TextBlock)]
-        )
+        toc_text = _build_toc(document.blocks, numbering)
+        matched = []
+        for block in document.blocks:
+            candidates = reusable.get(block)
+            matched.append(candidates.pop(0) if candidates else None)
+        # Unmatched text views of the outgoing document are recycled for
+        # changed text blocks rather than destroyed and rebuilt.
+        spare_text_views = [
+            widget
+            for leftovers in reusable.values()
+            for widget in leftovers
+            if type(widget) is _TextBlockView
+        ]
+        widgets: list[Gtk.Widget] = []
+        widget_blocks: list[Block | None] = []
+        reused: set[Gtk.Widget] = set()
         for index, block in enumerate(document.blocks):
-            widget = self._build_widget(block, toc_text, self._ui_mode, numbering, index)
-            if widget is None:
-                continue
-            self._block_widgets.append(widget)
-            self._column.append(widget)
+            widget = matched[index]
+            if widget is not None:
+                reused.add(widget)
+                if isinstance(widget, _TocBlockView):
+                    widget.set_text(toc_text)
+                elif isinstance(widget, _TextBlockView) and block.kind in _HEADING_KINDS:
+                    widget.set_text(_text_block_label(block, numbering, index))
+            elif (
+                spare_text_views
+                and isinstance(block, TextBlock)
+                and block.kind != "toc"
+            ):
+                widget = spare_text_views.pop()
+                reused.add(widget)
+                widget.reconfigure(
+                    _text_block_label(block, numbering, index), block.kind
+                )
+            else:
+                widget = self._build_widget(
+                    block, toc_text, self._ui_mode, numbering, index
+                )
+                if widget is None:
+                    continue
+            widgets.append(widget)
+            widget_blocks.append(block)
+
+        child = self._column.get_first_child()
+        while child is not None:
+            next_child = child.get_next_sibling()
+            if child not in reused:
+                self._column.remove(child)
+            child = next_child
+        previous_widget = None
+        for widget in widgets:
+            if widget in reused:
+                self._column.reorder_child_after(widget, previous_widget)
+            else:
+                self._column.insert_child_after(widget, previous_widget)
+            previous_widget = widget
+        self._block_widgets = widgets
+        self._widget_blocks = widget_blocks
 
         self._selected_index = min(
             self._selected_index, max(len(self._block_widgets) - 1, 0)
         )
         self._refresh_selection()
         self._column.queue_resize()
-        GLib.idle_add(self._column.queue_resize)
+        self._on_blocks_viewport_changed(None)
 
     def _tick_column_padding(self, _widget: Gtk.Widget, _frame_clock) -> bool:
         width = self._scroller.get_allocated_width()
@@ -257,63 +340,119 @@ class BlockEditorView(Gtk.Box):
         return True
 
     def insert_widget_after(self, index: int, block, document: BlockDocument) -> None:
-        numbering = build_heading_numbering(document.blocks)
-        toc_text = _build_toc(
-            [item for item in document.blocks if isinstance(item, TextBlock)]
-        )
-        insert_index = min(index + 1, len(document.blocks) - 1)
-        widget = self._build_widget(
-            block, toc_text, self._ui_mode, numbering, insert_index
-        )
-        if widget is None:
+        self.insert_widgets_after(index, [block], document)
+
+    def insert_and_select(
+        self,
+        position: int,
+        block,
+        document: BlockDocument,
+        preserve_scroll: bool = True,
+    ) -> None:
+        scroll_position = self.get_scroll_position()
+        self.insert_widget_after(position - 1, block, document)
+        self.set_selected_index(position)
+        if preserve_scroll:
+            self.set_scroll_position(scroll_position)
+
+    def insert_widgets_after(
+        self, index: int, blocks: Sequence, document: BlockDocument
+    ) -> None:
+        affects_outline = any(_affects_outline(block) for block in blocks)
+        if affects_outline and not document.batching:
+            numbering = build_heading_numbering(document.blocks)
+            toc_text = _build_toc(document.blocks, numbering)
+        else:
+            numbering = {}
+            toc_text = ""
+        first_index = min(index + 1, len(document.blocks) - 1)
+        widgets = []
+        widget_blocks = []
+        for offset, block in enumerate(blocks):
+            widget = self._build_widget(
+                block, toc_text, self._ui_mode, numbering, first_index + offset
+            )
+            if widget is not None:
+                widgets.append(widget)
+                widget_blocks.append(block)
+        if not widgets:
             return
         insert_at = min(index + 1, len(self._block_widgets))
-        self._block_widgets.insert(insert_at, widget)
-        self._column.insert_child_after(
-            widget, self._block_widgets[insert_at - 1] if insert_at > 0 else None
-        )
-        self.refresh_toc(document)
-        self.refresh_heading_numbering(document)
+        previous = self._block_widgets[insert_at - 1] if insert_at > 0 else None
+        self._block_widgets[insert_at:insert_at] = widgets
+        self._widget_blocks[insert_at:insert_at] = widget_blocks
+        for widget in widgets:
+            self._column.insert_child_after(widget, previous)
+            previous = widget
+        if affects_outline or self._toc_visible:
+            self.refresh_toc(document)
+        if affects_outline:
+            self.refresh_heading_numbering(document)
         self._column.queue_resize()
-        GLib.idle_add(self._column.queue_resize)
+        self._on_blocks_viewport_changed(None)
 
     def replace_widget_at(self, index: int, document: BlockDocument) -> bool:
         if index < 0 or index >= len(self._block_widgets):
             return False
         block = document.blocks[index]
-        numbering = build_heading_numbering(document.blocks)
-        toc_text = _build_toc(
-            [item for item in document.blocks if isinstance(item, TextBlock)]
-        )
+        if document.batching:
+            numbering = {}
+            toc_text = ""
+        else:
+            numbering = build_heading_numbering(document.blocks)
+            toc_text = _build_toc(document.blocks, numbering)
         widget = self._build_widget(block, toc_text, self._ui_mode, numbering, index)
         if widget is None:
             return False
         old_widget = self._block_widgets[index]
         self._column.remove(old_widget)
         self._block_widgets[index] = widget
+        self._widget_blocks[index] = block
         prev_widget = self._block_widgets[index - 1] if index > 0 else None
         self._column.insert_child_after(widget, prev_widget)
         self.refresh_toc(document)
         self.refresh_heading_numbering(document)
         self._refresh_selection()
         self._column.queue_resize()
-        GLib.idle_add(self._column.queue_resize)
+        self._on_blocks_viewport_changed(None)
         return True
 
     def remove_widget_at(self, index: int, document: BlockDocument) -> None:
         if index < 0 or index >= len(self._block_widgets):
             return
         widget = self._block_widgets.pop(index)
+        del self._widget_blocks[index]
         self._column.remove(widget)
         self.refresh_toc(document)
         self.refresh_heading_numbering(document)
 
+    def remove_widgets_range(
+        self, start: int, end: int, document: BlockDocument
+    ) -> None:
+        start = max(start, 0)
+        end = min(end, len(self._block_widgets) - 1)
+        if start > end:
+            return
+        widgets = self._block_widgets[start : end + 1]
+        del self._block_widgets[start : end + 1]
+        del self._widget_blocks[start : end + 1]
+        for widget in widgets:
+            self._column.remove(widget)
+        self.refresh_toc(document)
+        self.refresh_heading_numbering(document)
+
+    def refresh_outline(self, document: BlockDocument) -> None:
+        self.refresh_toc(document)
+        self.refresh_heading_numbering(document)
+
     def refresh_heading_numbering(self, document: BlockDocument) -> None:
+        if document.batching:
+            return
         numbering = build_heading_numbering(document.blocks)
         for index, (block, widget) in enumerate(zip(document.blocks, self._block_widgets)):
             if not isinstance(block, TextBlock):
                 continue
-            if block.kind not in {"h1", "h2", "h3", "h4", "h5", "h6"}:
+            if block.kind not in _HEADING_KINDS:
                 continue
             if not isinstance(widget, _TextBlockView):
                 continue
@@ -321,9 +460,9 @@ class BlockEditorView(Gtk.Box):
             widget.set_text(_format_heading_label(prefix, block.text))
 
     def refresh_toc(self, document: BlockDocument) -> None:
-        toc_text = _build_toc(
-            [block for block in document.blocks if isinstance(block, TextBlock)]
-        )
+        if document.batching:
+            return
+        toc_text = _build_toc(document.blocks)
         for block, widget in zip(document.blocks, self._block_widgets):
             if isinstance(block, TextBlock) and block.kind == "toc":
                 if isinstance(widget, _TocBlockView):
@@ -359,10 +498,10 @@ class BlockEditorView(Gtk.Box):
     def move_selection(self, delta: int) -> None:
         if not self._block_widgets:
             return
-        self._selected_index = max(
-            0, min(self._selected_index + delta, len(self._block_widgets) - 1)
-        )
-        self._refresh_selection()
+        index = max(0, min(self._selected_index + delta, len(self._block_widgets) - 1))
+        if index != self._selected_index:
+            self._selected_index = index
+            self._refresh_selection()
         self._schedule_scroll_to_selected()
 
     def visual_active(self) -> bool:
@@ -454,6 +593,7 @@ class BlockEditorView(Gtk.Box):
             if isinstance(block, PythonImageBlock):
                 widget.set_pending(False, block)
                 widget.update_block(block, self._ui_mode)
+                self._widget_blocks[index] = block
                 return True
         if isinstance(widget, _LatexBlockView):
             document = self._document
@@ -462,8 +602,9 @@ class BlockEditorView(Gtk.Box):
             block = document.blocks[index]
             if isinstance(block, LatexBlock):
                 widget.update_latex(block.source, self._ui_mode)
+                self._widget_blocks[index] = block
                 return True
-        if hasattr(widget, "reload_html"):
+        if isinstance(widget, _WEBVIEW_BLOCKS):
             try:
                 widget.reload_html()
                 return True
@@ -471,6 +612,27 @@ class BlockEditorView(Gtk.Box):
                 return False
         return False
 
+    def refresh_block_at(self, index: int) -> bool:
+        document = self._document
+        if document is None:
+            return False
+        if index < 0 or index >= len(document.blocks):
+            return False
+        block = document.blocks[index]
+        if isinstance(block, TextBlock):
+            return self.update_text_at(index, block.text)
+        if isinstance(block, (ThreeBlock, MapBlock)):
+            # Their pages are rendered once from the source, so an edited
+            # source needs a new widget; only an unchanged one is reloaded.
+            widget = (
+                self._block_widgets[index]
+                if index < len(self._block_widgets)
+                else None
+            )
+            if getattr(widget, "source", None) != block.source:
+                return self.replace_widget_at(index, document)
+        return self.reload_media_at(index)
+
     def update_text_at(self, index: int, text: str) -> bool:
         if not self._block_widgets:
             return False
@@ -479,12 +641,16 @@ class BlockEditorView(Gtk.Box):
         widget = self._block_widgets[index]
         if isinstance(widget, _TextBlockView):
             block = self._document.blocks[index] if self._document else None
-            if isinstance(block, TextBlock) and block.kind in {"h1", "h2", "h3", "h4", "h5", "h6"}:
+            if isinstance(block, TextBlock) and block.kind in _HEADING_KINDS:
                 numbering = build_heading_numbering(self._document.blocks) if self._document else {}
                 prefix = numbering.get(index, "")
                 widget.set_text(_format_heading_label(prefix, text))
             else:
                 widget.set_text(text)
+            if isinstance(block, TextBlock) and block.text == text:
+                self._widget_blocks[index] = block
+            else:
+                self._widget_blocks[index] = None
             return True
         return False
 
@@ -515,6 +681,7 @@ class BlockEditorView(Gtk.Box):
             last_error=None,
         )
         widget.update_block(pending, self._ui_mode)
+        self._widget_blocks[index] = pending
         return True
 
     def set_selected_index(self, index: int, scroll: bool = True) -> None:
@@ -530,13 +697,15 @@ class BlockEditorView(Gtk.Box):
             return
         if index < 0 or index >= len(self._block_widgets):
             return
-        widget = self._block_widgets[index]
-        allocation = widget.get_allocation()
         vadjustment = self._scroller.get_vadjustment()
         if vadjustment is None:
             return
+        bounds = self._block_bounds(self._block_widgets[index])
+        if bounds is None:
+            return
+        top, height = bounds
         page = vadjustment.get_page_size()
-        target = allocation.y + allocation.height / 2 - page / 2
+        target = top + height / 2 - page / 2
         vadjustment.set_value(max(0.0, target))
 
     def move_widget(self, from_index: int, to_index: int) -> None:
@@ -552,19 +721,23 @@ class BlockEditorView(Gtk.Box):
             return
         widget = self._block_widgets.pop(from_index)
         self._block_widgets.insert(to_index, widget)
-        self._column.remove(widget)
-        self._column.insert_child_after(
+        self._widget_blocks.insert(to_index, self._widget_blocks.pop(from_index))
+        # Reordering keeps the widget parented and realized, so WebViews keep
+        # their loaded page instead of reloading it after a remove/insert.
+        self._column.reorder_child_after(
             widget, self._block_widgets[to_index - 1] if to_index > 0 else None
         )
-        if hasattr(widget, "reload_html"):
-            try:
-                widget.reload_html()
-            except Exception:
-                pass
 
     def clear_selection(self) -> None:
-        for widget in self._block_widgets:
+        for widget, classes in list(self._selection_classes.items()):
+            if "block-selected" not in classes:
+                continue
             widget.remove_css_class("block-selected")
+            remaining = tuple(name for name in classes if name != "block-selected")
+            if remaining:
+                self._selection_classes[widget] = remaining
+            else:
+                del self._selection_classes[widget]
 
     def toggle_help(self) -> None:
         self._help_visible = not self._help_visible
@@ -584,11 +757,17 @@ class BlockEditorView(Gtk.Box):
         elif kind == "error":
             self._status_bar.add_css_class("status-error")
         self._status_bar.set_visible(True)
-        if self._status_timer_id is not None:
-            GLib.source_remove(self._status_timer_id)
-        self._status_timer_id = GLib.timeout_add(2500, self._clear_status)
+        # A running timer is left alone and re-armed for whatever remains
+        # when it fires, so bursts of messages share one timeout source.
+        self._status_deadline_ms = GLib.get_monotonic_time() // 1000 + 2500
+        if self._status_timer_id is None:
+            self._status_timer_id = GLib.timeout_add(2500, self._clear_status)
 
     def _clear_status(self) -> bool:
+        remaining = self._status_deadline_ms - GLib.get_monotonic_time() // 1000
+        if remaining > 0:
+            self._status_timer_id = GLib.timeout_add(remaining, self._clear_status)
+            return False
         self._status_bar.set_visible(False)
         self._status_timer_id = None
         return False
@@ -610,7 +789,7 @@ class BlockEditorView(Gtk.Box):
         self.set_document(document)
         self.set_selected_index(selected, scroll=False)
         self.set_scroll_position(scroll)
-        GLib.idle_add(self._restore_scroll_position, scroll)
+        self._after_layout(lambda: self._restore_scroll_position(scroll))
         GLib.timeout_add(120, self._restore_scroll_position, scroll)
 
     def _restore_scroll_position(self, scroll: float) -> bool:
@@ -936,7 +1115,7 @@ class BlockEditorView(Gtk.Box):
         if self._vault_rename_active:
             self._vault_rename_active = False
             self._vault_rename_source = None
-        for child in list(self._vault_list):
+        while (child := self._vault_list.get_first_child()) is not None:
             self._vault_list.remove(child)
         self._vault_rows = []
 
@@ -1385,7 +1564,7 @@ class BlockEditorView(Gtk.Box):
         return entries
 
     def _render_toc_entries(self) -> None:
-        for child in list(self._toc_list):
+        while (child := self._toc_list.get_first_child()) is not None:
             self._toc_list.remove(child)
         self._toc_rows = []
         self._toc_visible_entries = []
@@ -1540,77 +1719,154 @@ class BlockEditorView(Gtk.Box):
         self._refresh_selection()
 
     def _refresh_selection(self) -> None:
-        start = None
-        end = None
-        multi_range = False
+        # Only widgets whose selection classes change are touched, so moving
+        # the cursor restyles two widgets instead of the whole column.
+        widgets = self._block_widgets
+        wanted: dict[Gtk.Widget, tuple[str, ...]] = {}
         if self._visual_active:
             start, end = self.get_visual_range()
             multi_range = start != end
-        for index, widget in enumerate(self._block_widgets):
-            in_range = False
-            if start is not None and end is not None:
-                in_range = start <= index <= end
-            widget.remove_css_class("block-range-start")
-            widget.remove_css_class("block-range-middle")
-            widget.remove_css_class("block-range-end")
-            if index == self._selected_index:
-                widget.add_css_class("block-selected")
-                widget.remove_css_class("block-selected-range")
-            elif in_range:
-                widget.remove_css_class("block-selected")
-                widget.add_css_class("block-selected-range")
-            else:
-                widget.remove_css_class("block-selected")
-                widget.remove_css_class("block-selected-range")
-            if not in_range or not multi_range:
+            for index in range(max(start, 0), min(end, len(widgets) - 1) + 1):
+                if index == self._selected_index:
+                    classes = ["block-selected"]
+                else:
+                    classes = ["block-selected-range"]
+                if multi_range:
+                    if index == start:
+                        classes.append("block-range-start")
+                    elif index == end:
+                        classes.append("block-range-end")
+                    else:
+                        classes.append("block-range-middle")
+                wanted[widgets[index]] = tuple(classes)
+        if 0 <= self._selected_index < len(widgets):
+            selected = widgets[self._selected_index]
+            if selected not in wanted:
+                wanted[selected] = ("block-selected",)
+        previous = self._selection_classes
+        for widget, classes in previous.items():
+            if widget in wanted:
+                continue
+            for name in classes:
+                widget.remove_css_class(name)
+        for widget, classes in wanted.items():
+            old = previous.get(widget, ())
+            if old == classes:
+                continue
+            for name in old:
+                if name not in classes:
+                    widget.remove_css_class(name)
+            for name in classes:
+                if name not in old:
+                    widget.add_css_class(name)
+        self._selection_classes = wanted
+
+    def _on_blocks_viewport_changed(self, _adjustment) -> None:
+        if self._webview_pending:
+            return
+        self._webview_pending = True
+        self._webview_retries = 0
+        self._after_layout(self._build_visible_webviews)
+
+    def _build_visible_webviews(self) -> bool:
+        # 3D, LaTeX and map blocks create their WebViews only once they come
+        # within a page of the viewport. Blocks not yet measured are retried
+        # on the next few layouts.
+        vadjustment = self._scroller.get_vadjustment()
+        if vadjustment is None:
+            self._webview_pending = False
+            return False
+        page_size = vadjustment.get_page_size()
+        value = vadjustment.get_value()
+        view_top = value - page_size
+        view_bottom = value + 2 * page_size
+        unmeasured = False
+        for widget in self._block_widgets:
+            if not isinstance(widget, _WEBVIEW_BLOCKS) or not widget.needs_view:
                 continue
-            if index == start:
-                widget.add_css_class("block-range-start")
-            elif index == end:
-                widget.add_css_class("block-range-end")
+            bounds = self._block_bounds(widget)
+            if bounds is None or bounds[1] <= 0.0:
+                unmeasured = True
+                continue
+            top, height = bounds
+            if top + height < view_top:
+                continue
+            if top > view_bottom:
+                break
+            widget.ensure_view()
+        if unmeasured and self._webview_retries < 3:
+            self._webview_retries += 1
+            return True
+        self._webview_pending = False
+        return False
+
+    def _after_layout(self, callback: Callable[[], bool]) -> None:
+        # Runs after GTK's layout phase so block bounds read by the callback
+        # belong to the frame being drawn; repeats while it returns True.
+        clock = self.get_frame_clock()
+        if clock is None:
+            GLib.idle_add(callback)
+            return
+
+        def on_layout(frame_clock) -> None:
+            if callback():
+                frame_clock.request_phase(Gdk.FrameClockPhase.LAYOUT)
             else:
-                widget.add_css_class("block-range-middle")
+                frame_clock.disconnect(handler_id)
+
+        handler_id = clock.connect("layout", on_layout)
+        clock.request_phase(Gdk.FrameClockPhase.LAYOUT)
 
     def _schedule_scroll_to_selected(self) -> None:
-        if self._scroll_idle_id is not None:
+        if self._scroll_pending:
             return
+        self._scroll_pending = True
         self._scroll_retries = 0
-        self._scroll_idle_id = GLib.idle_add(self._deferred_scroll_to_selected)
+        self._after_layout(self._deferred_scroll_to_selected)
 
     def _deferred_scroll_to_selected(self) -> bool:
         if self._scroll_to_selected_if_needed():
-            self._scroll_idle_id = None
+            self._scroll_pending = False
             return False
         self._scroll_retries += 1
         if self._scroll_retries >= 3:
-            self._scroll_idle_id = None
+            self._scroll_pending = False
             return False
         return True
 
     def _scroll_to_selected_if_needed(self) -> bool:
         if not self._block_widgets:
             return True
-        widget = self._block_widgets[self._selected_index]
-        allocation = widget.get_allocation()
         vadjustment = self._scroller.get_vadjustment()
         if vadjustment is None:
             return True
-        if allocation.height <= 0 and allocation.y == 0:
+        bounds = self._block_bounds(self._block_widgets[self._selected_index])
+        if bounds is None:
             return False
-        top = allocation.y
-        bottom = allocation.y + allocation.height
+        top, height = bounds
+        if height <= 0.0 and top == 0.0:
+            return False
+        bottom = top + height
         if self._selected_index == len(self._block_widgets) - 1:
-            bottom += 120
+            bottom += 120.0
+        page_size = vadjustment.get_page_size()
         view_top = vadjustment.get_value()
-        view_bottom = view_top + vadjustment.get_page_size()
+        view_bottom = view_top + page_size
         if view_top <= top and bottom <= view_bottom:
             return True
         if top < view_top:
-            vadjustment.set_value(max(0, top - 12))
+            vadjustment.set_value(max(0.0, top - 12.0))
         elif bottom > view_bottom:
-            vadjustment.set_value(max(0, bottom - vadjustment.get_page_size() + 12))
+            vadjustment.set_value(max(0.0, bottom - page_size + 12.0))
         return True
 
+    def _block_bounds(self, widget: Gtk.Widget) -> tuple[float, float] | None:
+        # (top, height) of a block widget within the column.
+        ok, bounds = widget.compute_bounds(self._column)
+        if not ok:
+            return None
+        return bounds.get_y(), bounds.get_height()
+
     def _build_help_overlay(self) -> Gtk.Widget:
         overlay = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         overlay.set_hexpand(True)
@@ -1664,48 +1920,24 @@ class BlockEditorView(Gtk.Box):
         numbering: dict[int, str],
         index: int,
     ) -> Gtk.Widget | None:
-        if isinstance(block, TextBlock):
-            if block.kind == "toc":
-                return _TocBlockView(toc_text)
-            if block.kind in {"h1", "h2", "h3", "h4", "h5", "h6"}:
-                prefix = numbering.get(index, "")
-                return _TextBlockView(_format_heading_label(prefix, block.text), block.kind)
-            return _TextBlockView(block.text, block.kind)
-        if isinstance(block, ThreeBlock):
-            return _ThreeBlockView(block.source, ui_mode)
-        if isinstance(block, PythonImageBlock):
-            return _PyImageBlockView(block, ui_mode)
-        if isinstance(block, LatexBlock):
-            return _LatexBlockView(block.source, ui_mode)
-        if isinstance(block, MapBlock):
-            return _MapBlockView(block.source, ui_mode)
-        return None
+        builder = _WIDGET_BUILDERS.get(type(block))
+        if builder is None:
+            return None
+        return builder(block, toc_text, ui_mode, numbering, index)
 
 
 class _TextBlockView(Gtk.Frame):
     def __init__(self, text: str, kind: str) -> None:
         super().__init__()
-        self.add_css_class("block")
-        self.add_css_class("block-text")
-        self.add_css_class(f"block-text-{kind}")
+        self.set_css_classes(["block", "block-text", f"block-text-{kind}"])
+        self._kind = kind
 
         self._text_view = Gtk.TextView()
         self._text_view.set_monospace(True)
         self._text_view.set_wrap_mode(Gtk.WrapMode.WORD_CHAR)
-        if kind in {"title", "h1", "h2", "h3", "h4", "h5", "h6"}:
-            self._text_view.set_top_margin(10)
-            self._text_view.set_bottom_margin(8)
-        else:
-            self._text_view.set_top_margin(12)
-            self._text_view.set_bottom_margin(12)
+        self._apply_kind_spacing(kind)
         self._text_view.set_left_margin(12)
         self._text_view.set_right_margin(12)
-        if kind in {"title", "h1", "h2", "h3", "h4", "h5", "h6"}:
-            self._text_view.set_pixels_above_lines(1)
-            self._text_view.set_pixels_below_lines(1)
-        else:
-            self._text_view.set_pixels_above_lines(0)
-            self._text_view.set_pixels_below_lines(0)
         self._text_view.set_pixels_inside_wrap(0)
         self._text_view.set_editable(False)
         self._text_view.set_cursor_visible(False)
@@ -1715,17 +1947,91 @@ class _TextBlockView(Gtk.Frame):
 
         self.set_child(self._text_view)
 
+    def _apply_kind_spacing(self, kind: str) -> None:
+        top, bottom, above, below = _TEXT_SPACING.get(kind, _BODY_TEXT_SPACING)
+        self._text_view.set_top_margin(top)
+        self._text_view.set_bottom_margin(bottom)
+        self._text_view.set_pixels_above_lines(above)
+        self._text_view.set_pixels_below_lines(below)
+
+    def reconfigure(self, text: str, kind: str) -> None:
+        if kind != self._kind:
+            self.remove_css_class(f"block-text-{self._kind}")
+            self.add_css_class(f"block-text-{kind}")
+            self._apply_kind_spacing(kind)
+            self._kind = kind
+        self.set_text(text)
+
     def set_text(self, text: str) -> None:
         buffer = self._text_view.get_buffer()
         buffer.set_text(text)
 
 
+# Live 3D views; new ones are created related to one of these so every 3D
+# block shares a single web process instead of spawning its own.
+_THREE_WEBVIEWS: weakref.WeakSet = weakref.WeakSet()
+
+
+_THREE_SETTINGS = (
+    ("set_enable_javascript", True),
+    ("set_enable_webgl", True),
+    ("set_enable_developer_extras", True),
+    ("set_allow_file_access_from_file_urls", True),
+    ("set_allow_universal_access_from_file_urls", True),
+)
+
+
+_LATEX_SETTINGS = (
+    ("set_enable_javascript", True),
+    ("set_allow_file_access_from_file_urls", True),
+    ("set_allow_universal_access_from_file_urls", True),
+)
+
+_MAP_SETTINGS = (
+    ("set_enable_javascript", True),
+    ("set_allow_universal_access_from_file_urls", True),
+)
+
+
+@lru_cache(maxsize=None)
+def _webview_settings(options: tuple[tuple[str, bool], ...]):
+    settings = WebKit.Settings()  # type: ignore[union-attr]
+    for name, value in options:
+        setter = getattr(settings, name, None)
+        if setter is not None:
+            setter(value)
+    return settings
+
+
+@lru_cache(maxsize=None)
+def _webview_background(ui_mode: str) -> Gdk.RGBA:
+    # set_background_color copies the color, so one instance per mode serves
+    # every WebView.
+    bg_red, bg_green, bg_blue, bg_alpha = colors_for(ui_mode).webkit_background_rgba
+    background = Gdk.RGBA()
+    background.red = bg_red
+    background.green = bg_green
+    background.blue = bg_blue
+    background.alpha = bg_alpha
+    return background
+
+
+def _new_three_webview():
+    for related in _THREE_WEBVIEWS:
+        view = WebKit.WebView(related_view=related)  # type: ignore[union-attr]
+        break
+    else:
+        view = WebKit.WebView()  # type: ignore[union-attr, attr-defined]
+    _THREE_WEBVIEWS.add(view)
+    return view
+
+
 class _ThreeBlockView(Gtk.Frame):
     def __init__(self, source: str, ui_mode: str) -> None:
         super().__init__()
         self._ui_mode = ui_mode
-        self.add_css_class("block")
-        self.add_css_class("block-three")
+        self.set_css_classes(["block", "block-three"])
+        self.source = source
 
         self.view = None
         self._html = None
@@ -1743,13 +2049,20 @@ class _ThreeBlockView(Gtk.Frame):
             self.set_child(label)
             return
 
-        source = render_three_html(source, ui_mode).replace(
-            "__GVIM_THREE_SRC__", _three_module_uri()
-        )
-        self._html = source
-        self._build_view()
+        self._html = _three_html(source, ui_mode)
+        # The WebView is built by ensure_view() once the block nears the
+        # viewport; until then the box only reserves its height.
+        self._box.set_size_request(-1, 300)
         self.set_child(self._box)
 
+    @property
+    def needs_view(self) -> bool:
+        return self.view is None and self._html is not None
+
+    def ensure_view(self) -> None:
+        if self.needs_view:
+            self._build_view()
+
     def reload_html(self) -> None:
         if self.view is None or self._html is None:
             return
@@ -1758,28 +2071,10 @@ class _ThreeBlockView(Gtk.Frame):
     def _build_view(self) -> None:
         if WebKit is None:
             return
-        palette = colors_for(self._ui_mode)
-        bg_red, bg_green, bg_blue, bg_alpha = palette.webkit_background_rgba
-        view = WebKit.WebView()  # type: ignore[union-attr, attr-defined]
-        settings = view.get_settings()
-        if settings is not None:
-            if hasattr(settings, "set_enable_javascript"):
-                settings.set_enable_javascript(True)
-            if hasattr(settings, "set_enable_webgl"):
-                settings.set_enable_webgl(True)
-            if hasattr(settings, "set_enable_developer_extras"):
-                settings.set_enable_developer_extras(True)
-            if hasattr(settings, "set_allow_file_access_from_file_urls"):
-                settings.set_allow_file_access_from_file_urls(True)
-            if hasattr(settings, "set_allow_universal_access_from_file_urls"):
-                settings.set_allow_universal_access_from_file_urls(True)
-        background = Gdk.RGBA()
-        background.red = bg_red
-        background.green = bg_green
-        background.blue = bg_blue
-        background.alpha = bg_alpha
+        view = _new_three_webview()
+        view.set_settings(_webview_settings(_THREE_SETTINGS))
         if hasattr(view, "set_background_color"):
-            view.set_background_color(background)
+            view.set_background_color(_webview_background(self._ui_mode))
         view.set_vexpand(False)
         view.set_hexpand(True)
         view.set_size_request(-1, 300)
@@ -1793,14 +2088,15 @@ class _PyImageBlockView(Gtk.Frame):
         super().__init__()
         self._ui_mode = ui_mode
         self._pending = False
-        self.add_css_class("block")
-        self.add_css_class("block-image")
-        self.add_css_class("block-pyimage")
+        # Bumped on every update so late materialization results are dropped.
+        self._update_token = 0
+        self.set_css_classes(["block", "block-image", "block-pyimage"])
         self.set_hexpand(True)
         self.set_halign(Gtk.Align.FILL)
         self.update_block(block, ui_mode)
 
     def update_block(self, block: PythonImageBlock, ui_mode: str) -> None:
+        self._update_token += 1
         if self._pending:
             self._set_pending_label(block)
             return
@@ -1813,9 +2109,37 @@ class _PyImageBlockView(Gtk.Frame):
             rendered_hash = block.rendered_hash_dark
             rendered_path = block.rendered_path_dark
 
-        path = rendered_path or _materialize_pyimage(rendered_data, rendered_hash)
-        if path and os.path.exists(path):
-            picture = Gtk.Picture.new_for_filename(path)
+        path = rendered_path or _cached_pyimage_path(rendered_data, rendered_hash)
+        if self._show_picture(path):
+            return
+        if rendered_data:
+            # Writing the SVG out happens on the pyimage worker; the picture is
+            # swapped in from the main loop once the file exists.
+            self._set_pending_label(block)
+            token = self._update_token
+
+            def _job() -> None:
+                if token != self._update_token:
+                    return
+                materialized = _materialize_pyimage(rendered_data, rendered_hash)
+                GLib.idle_add(self._on_materialized, token, materialized, block)
+
+            _queue_pyimage_job(_job)
+            return
+        self._set_pending_label(block)
+
+    def _on_materialized(
+        self, token: int, path: str | None, block: PythonImageBlock
+    ) -> bool:
+        if token != self._update_token or self._pending:
+            return False
+        if not self._show_picture(path):
+            self._set_pending_label(block)
+        return False
+
+    def _show_picture(self, path: str | None) -> bool:
+        picture = _pyimage_picture(path) if path else None
+        if picture is not None:
             picture.set_can_shrink(True)
             picture.set_content_fit(Gtk.ContentFit.SCALE_DOWN)
             picture.set_size_request(-1, 300)
@@ -1831,9 +2155,8 @@ class _PyImageBlockView(Gtk.Frame):
             box.add_css_class("pyimage-container")
             box.append(picture)
             self.set_child(box)
-            return
-
-        self._set_pending_label(block)
+            return True
+        return False
 
     def set_pending(self, pending: bool, block: PythonImageBlock) -> None:
         self._pending = pending
@@ -1855,8 +2178,7 @@ class _LatexBlockView(Gtk.Frame):
     def __init__(self, source: str, ui_mode: str) -> None:
         super().__init__()
         self._ui_mode = ui_mode
-        self.add_css_class("block")
-        self.add_css_class("block-three")
+        self.set_css_classes(["block", "block-three"])
 
         self.view = None
         self._html = None
@@ -1876,29 +2198,27 @@ class _LatexBlockView(Gtk.Frame):
             self.set_child(label)
             return
 
+        self._html = _latex_html(source, ui_mode)
+        self._box.set_size_request(-1, 80)
+        self.set_child(self._box)
+
+    @property
+    def needs_view(self) -> bool:
+        return self.view is None and self._html is not None
+
+    def ensure_view(self) -> None:
+        if self.needs_view:
+            self._build_view()
+
+    def _build_view(self) -> None:
         view = WebKit.WebView()  # type: ignore[union-attr]
-        settings = view.get_settings()
-        if settings is not None:
-            if hasattr(settings, "set_enable_javascript"):
-                settings.set_enable_javascript(True)
-            if hasattr(settings, "set_allow_file_access_from_file_urls"):
-                settings.set_allow_file_access_from_file_urls(True)
-            if hasattr(settings, "set_allow_universal_access_from_file_urls"):
-                settings.set_allow_universal_access_from_file_urls(True)
-        palette = colors_for(self._ui_mode)
-        bg_red, bg_green, bg_blue, bg_alpha = palette.webkit_background_rgba
-        background = Gdk.RGBA()
-        background.red = bg_red
-        background.green = bg_green
-        background.blue = bg_blue
-        background.alpha = bg_alpha
+        view.set_settings(_webview_settings(_LATEX_SETTINGS))
         if hasattr(view, "set_background_color"):
-            view.set_background_color(background)
+            view.set_background_color(_webview_background(self._ui_mode))
         view.set_vexpand(False)
         view.set_hexpand(True)
         view.set_size_request(-1, 80)
         view.set_valign(Gtk.Align.START)
-        self._html = render_latex_html(source, ui_mode)
         self._pending_load = True
         if hasattr(view, "get_mapped") and view.get_mapped():
             view.load_html(self._html, "file:///")
@@ -1909,7 +2229,6 @@ class _LatexBlockView(Gtk.Frame):
             view.connect("load-changed", self._on_latex_load_changed)
         self.view = view
         self._box.append(view)
-        self.set_child(self._box)
 
     def reload_html(self) -> None:
         if self.view is None or self._html is None:
@@ -1921,9 +2240,11 @@ class _LatexBlockView(Gtk.Frame):
 
     def update_latex(self, source: str, ui_mode: str) -> None:
         self._ui_mode = ui_mode
+        if self._html is None:
+            return
+        self._html = _latex_html(source, ui_mode)
         if self.view is None:
             return
-        self._html = render_latex_html(source, ui_mode)
         if hasattr(self.view, "get_mapped") and not self.view.get_mapped():
             self._pending_load = True
             return
@@ -1943,8 +2264,8 @@ class _MapBlockView(Gtk.Frame):
     def __init__(self, source: str, ui_mode: str) -> None:
         super().__init__()
         self._ui_mode = ui_mode
-        self.add_css_class("block")
-        self.add_css_class("block-map")
+        self.set_css_classes(["block", "block-map"])
+        self.source = source
 
         self.view_dark = None
         self.view_light = None
@@ -1965,16 +2286,23 @@ class _MapBlockView(Gtk.Frame):
             self.set_child(label)
             return
 
-        self._html_dark = render_map_html(source, "dark")
-        self._html_light = render_map_html(source, "light")
+        self._html_dark = _map_html(source, "dark")
+        self._html_light = _map_html(source, "light")
+        self._box.set_size_request(-1, 320)
+        self.set_child(self._box)
+
+    @property
+    def needs_view(self) -> bool:
+        return self.view_dark is None and self._html_dark is not None
 
+    def ensure_view(self) -> None:
+        if not self.needs_view:
+            return
         self.view_dark = self._build_map_view(self._html_dark)
         self.view_light = self._build_map_view(self._html_light)
-
         self._box.append(self.view_dark)
         self._box.append(self.view_light)
         self._set_theme_visibility()
-        self.set_child(self._box)
 
     def reload_html(self) -> None:
         if self.view_dark is not None and self._html_dark is not None:
@@ -1988,21 +2316,9 @@ class _MapBlockView(Gtk.Frame):
 
     def _build_map_view(self, html: str) -> Gtk.Widget:
         view = WebKit.WebView()  # type: ignore[union-attr]
-        settings = view.get_settings()
-        if settings is not None:
-            if hasattr(settings, "set_enable_javascript"):
-                settings.set_enable_javascript(True)
-            if hasattr(settings, "set_allow_universal_access_from_file_urls"):
-                settings.set_allow_universal_access_from_file_urls(True)
-        palette = colors_for(self._ui_mode)
-        bg_red, bg_green, bg_blue, bg_alpha = palette.webkit_background_rgba
-        background = Gdk.RGBA()
-        background.red = bg_red
-        background.green = bg_green
-        background.blue = bg_blue
-        background.alpha = bg_alpha
+        view.set_settings(_webview_settings(_MAP_SETTINGS))
         if hasattr(view, "set_background_color"):
-            view.set_background_color(background)
+            view.set_background_color(_webview_background(self._ui_mode))
         view.set_vexpand(False)
         view.set_hexpand(True)
         view.set_size_request(-1, 320)
@@ -2045,44 +2361,87 @@ class _MapBlockView(Gtk.Frame):
         )
 
 
+_WEBVIEW_BLOCKS = (_ThreeBlockView, _LatexBlockView, _MapBlockView)
+
+
+def _build_text_widget(
+    block: TextBlock, toc_text: str, _ui_mode: str, numbering: dict[int, str], index: int
+) -> Gtk.Widget:
+    if block.kind == "toc":
+        return _TocBlockView(toc_text)
+    return _TextBlockView(_text_block_label(block, numbering, index), block.kind)
+
+
+def _text_block_label(block: TextBlock, numbering: dict[int, str], index: int) -> str:
+    if block.kind in _HEADING_KINDS:
+        return _format_heading_label(numbering.get(index, ""), block.text)
+    return block.text
+
+
+# Block type -> widget builder taking (block, toc_text, ui_mode, numbering, index).
+_WIDGET_BUILDERS: dict[type, Callable[..., Gtk.Widget]] = {
+    TextBlock: _build_text_widget,
+    ThreeBlock: lambda block, _toc, ui_mode, _num, _index: _ThreeBlockView(
+        block.source, ui_mode
+    ),
+    PythonImageBlock: lambda block, _toc, ui_mode, _num, _index: _PyImageBlockView(
+        block, ui_mode
+    ),
+    LatexBlock: lambda block, _toc, ui_mode, _num, _index: _LatexBlockView(
+        block.source, ui_mode
+    ),
+    MapBlock: lambda block, _toc, ui_mode, _num, _index: _MapBlockView(
+        block.source, ui_mode
+    ),
+}
+
+
+def _affects_outline(block) -> bool:
+    # Only headings and the TOC block change numbering or TOC text; other
+    # inserts leave every existing label untouched.
+    return isinstance(block, TextBlock) and (
+        block.kind == "toc" or block.kind in _HEADING_KINDS
+    )
+
+
+@lru_cache(maxsize=1)
 def _three_module_uri() -> str:
     bundled = Path(__file__).with_name("three.module.min.js")
     return bundled.resolve().as_uri()
 
 
-def _build_toc(blocks: Sequence[TextBlock]) -> str:
-    headings = []
-    numbering = build_heading_numbering(blocks)
-    for index, block in enumerate(blocks):
-        if isinstance(block, TextBlock) and block.kind in {
-            "h1",
-            "h2",
-            "h3",
-            "h4",
-            "h5",
-            "h6",
-        }:
-            text = block.text.strip().splitlines()[0] if block.text.strip() else ""
-            prefix = numbering.get(index, "")
-            headings.append((block.kind, _format_heading_label(prefix, text)))
+# Rebuilt widgets for unchanged blocks get their page from these caches
+# instead of re-running the templates.
+@lru_cache(maxsize=64)
+def _three_html(source: str, ui_mode: str) -> str:
+    return render_three_html(source, ui_mode, module_src=_three_module_uri())
+
+
+@lru_cache(maxsize=64)
+def _latex_html(source: str, ui_mode: str) -> str:
+    return render_latex_html(source, ui_mode)
 
-    if not headings:
-        return "(No headings yet)"
 
-    lines = []
-    for kind, text in headings:
-        indent = ""
-        if kind == "h2":
-            indent = "  "
-        elif kind == "h3":
-            indent = "    "
-        elif kind == "h4":
-            indent = "      "
-        elif kind == "h5":
-            indent = "        "
-        elif kind == "h6":
-            indent = "          "
-        lines.append(f"{indent}- {text}")
+@lru_cache(maxsize=64)
+def _map_html(source: str, ui_mode: str) -> str:
+    return render_map_html(source, ui_mode)
+
+
+def _build_toc(
+    blocks: Sequence[Block], numbering: dict[int, str] | None = None
+) -> str:
+    if numbering is None:
+        numbering = build_heading_numbering(blocks)
+    lines = [
+        f"{_TOC_INDENTS[block.kind]}- "
+        + _format_heading_label(
+            numbering.get(index, ""), block.text.strip().partition("\n")[0]
+        )
+        for index, block in enumerate(blocks)
+        if isinstance(block, TextBlock) and block.kind in _HEADING_KINDS
+    ]
+    if not lines:
+        return "(No headings yet)"
     return "\n".join(lines)
 
 
@@ -2096,11 +2455,82 @@ def _format_heading_label(prefix: str, text: str) -> str:
     return f"{prefix} {text}"
 
 
-def _apply_block_padding(widget: Gtk.Widget, padding: int = 12) -> None:
-    widget.set_margin_top(padding)
-    widget.set_margin_bottom(padding)
-    widget.set_margin_start(padding)
-    widget.set_margin_end(padding)
+def _apply_block_padding(widget: Gtk.Widget) -> None:
+    # The 12px inset lives in style.css (.block-pad).
+    widget.add_css_class("block-pad")
+
+
+# Image path -> SVG text this process last wrote there, least recently used
+# first. Dark and light renders share a hash (and so a path), hence the
+# content check.
+_MATERIALIZED_PYIMAGES: OrderedDict[str, str] = OrderedDict()
+_MATERIALIZED_PYIMAGE_LIMIT = 32
+_MATERIALIZE_LOCK = threading.Lock()
+
+# One daemon thread writes every pyimage SVG, in request order; it is
+# started with the first job.
+_PYIMAGE_JOBS: queue.SimpleQueue[Callable[[], None]] = queue.SimpleQueue()
+_pyimage_worker: threading.Thread | None = None
+
+
+def _queue_pyimage_job(job: Callable[[], None]) -> None:
+    global _pyimage_worker
+    if _pyimage_worker is None:
+        _pyimage_worker = threading.Thread(
+            target=_run_pyimage_jobs, name="gvim-pyimage", daemon=True
+        )
+        _pyimage_worker.start()
+    _PYIMAGE_JOBS.put(job)
+
+
+def _run_pyimage_jobs() -> None:
+    while True:
+        job = _PYIMAGE_JOBS.get()
+        try:
+            job()
+        except Exception:
+            traceback.print_exc()
+
+
+def _pyimage_cache_path(rendered_data: str, rendered_hash: str | None) -> Path:
+    cache_root = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    cache_dir = cache_root / "gvim" / "pyimage"
+    if rendered_hash:
+        # Already a sha256 hex digest of the render inputs (py_runner).
+        digest = rendered_hash[:16]
+    else:
+        digest = hashlib.blake2b(
+            rendered_data.encode("utf-8"), digest_size=8
+        ).hexdigest()
+    extension = ".svg"
+    return cache_dir / f"pyimage-{digest}{extension}"
+
+
+def _cached_pyimage_path(
+    rendered_data: str | None, rendered_hash: str | None
+) -> str | None:
+    if not rendered_data:
+        return None
+    # The caller's stat of the returned path catches files removed since.
+    path_text = _pyimage_cache_path(rendered_data, rendered_hash).as_posix()
+    with _MATERIALIZE_LOCK:
+        if _MATERIALIZED_PYIMAGES.get(path_text) is not rendered_data:
+            return None
+        _MATERIALIZED_PYIMAGES.move_to_end(path_text)
+    return path_text
+
+
+def _pyimage_picture(path: str) -> Gtk.Picture | None:
+    # Gtk.Picture loads the SVG at the widget's scale factor, so plots stay
+    # sharp on HiDPI screens. The stat is the existence check.
+    try:
+        os.stat(path)
+    except OSError:
+        return None
+    return Gtk.Picture.new_for_filename(path)
+
+
+_PYIMAGE_WRITE_CHUNK = 1 << 20
 
 
 def _materialize_pyimage(
@@ -2108,15 +2538,39 @@ def _materialize_pyimage(
 ) -> str | None:
     if not rendered_data:
         return None
-    cache_root = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
-    cache_dir = cache_root / "gvim" / "pyimage"
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    digest_source = rendered_hash or rendered_data
-    digest = hashlib.sha256(digest_source.encode("utf-8")).hexdigest()[:16]
-    extension = ".svg"
-    image_path = cache_dir / f"pyimage-{digest}{extension}"
+    image_path = _pyimage_cache_path(rendered_data, rendered_hash)
+    path_text = image_path.as_posix()
+    # Materialization runs on the pyimage worker while the main loop reads
+    # the memo. Only the memo is locked; a stale entry is dropped before the
+    # file is rewritten so no reader pairs it with the new contents.
+    with _MATERIALIZE_LOCK:
+        written = _MATERIALIZED_PYIMAGES.get(path_text) is rendered_data
+        if written:
+            _MATERIALIZED_PYIMAGES.move_to_end(path_text)
+        else:
+            _MATERIALIZED_PYIMAGES.pop(path_text, None)
+    if written and image_path.exists():
+        return path_text
+    image_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write beside the target and rename so a picture never loads a
+    # half-written SVG.
+    temp_path = image_path.with_name(f".{image_path.name}.{os.getpid()}.tmp")
     try:
-        image_path.write_text(rendered_data, encoding="utf-8")
+        # Encoding in slices keeps a multi-megabyte SVG from being held a
+        # second time as one full UTF-8 buffer.
+        with temp_path.open("w", encoding="utf-8", newline="") as handle:
+            for start in range(0, len(rendered_data), _PYIMAGE_WRITE_CHUNK):
+                handle.write(rendered_data[start : start + _PYIMAGE_WRITE_CHUNK])
+        os.replace(temp_path, image_path)
     except (OSError, ValueError):
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
         return None
-    return image_path.as_posix()
+    with _MATERIALIZE_LOCK:
+        _MATERIALIZED_PYIMAGES[path_text] = rendered_data
+        _MATERIALIZED_PYIMAGES.move_to_end(path_text)
+        while len(_MATERIALIZED_PYIMAGES) > _MATERIALIZED_PYIMAGE_LIMIT:
+            _MATERIALIZED_PYIMAGES.popitem(last=False)
+    return path_text
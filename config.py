@@ -8,6 +8,9 @@ import os
 from pathlib import Path
 
 
+_ui_mode_cache: tuple[tuple, str | None] | None = None
+
+
 def get_config_dir() -> Path:
     root = Path(os.environ.get("XDG_CONFIG_HOME", Path.home() / ".config"))
     return root / "gvim"
@@ -40,12 +43,24 @@ def load_config() -> dict:
 
 
 def save_config(config: dict) -> None:
+    global _ui_mode_cache
+    _ui_mode_cache = None
     path = get_config_path()
     path.parent.mkdir(parents=True, exist_ok=True)
     path.write_text(json.dumps(config, indent=2, sort_keys=True), encoding="utf-8")
 
 
 def get_ui_mode() -> str | None:
+    global _ui_mode_cache
+    stamp = _config_stamp()
+    if _ui_mode_cache is not None and _ui_mode_cache[0] == stamp:
+        return _ui_mode_cache[1]
+    mode = _read_ui_mode()
+    _ui_mode_cache = (stamp, mode)
+    return mode
+
+
+def _read_ui_mode() -> str | None:
     config = load_config()
     value = config.get("mode")
     if isinstance(value, str) and value.strip():
@@ -57,6 +72,15 @@ def get_ui_mode() -> str | None:
     return None
 
 
+def _config_stamp() -> tuple:
+    path = get_config_path()
+    try:
+        stat = path.stat()
+    except OSError:
+        return (path,)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
 def set_ui_mode(mode: str) -> None:
     config = load_config()
     config["mode"] = mode
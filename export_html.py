@@ -11,6 +11,7 @@ from urllib.parse import quote
 import py_runner
 from design_constants import colors_for, font
 from block_model import (
+    HEADING_LEVELS,
     BlockDocument,
     LatexBlock,
     MapBlock,
@@ -701,7 +702,7 @@ def _render_text_block(
         return f'<section class="block {kind_class}">{toc_text}</section>'
     text_source = block.text
     text = _escape_html(text_source)
-    if block.kind in {"h1", "h2", "h3", "h4", "h5", "h6"}:
+    if block.kind in HEADING_LEVELS:
         prefix = numbering.get(index, "")
         if prefix:
             text = _escape_html(_format_heading_label(prefix, text_source))
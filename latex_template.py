@@ -7,6 +7,9 @@ import config
 from design_constants import colors_for
 
 
+LATEX_SAMPLE = r"\int_0^\infty e^{-x^2} dx = \frac{\sqrt{\pi}}{2}"
+
+
 def render_latex_html(source: str, ui_mode: str | None = None) -> str:
     palette = colors_for(ui_mode or config.get_ui_mode() or "dark")
     text_color = palette.webkit_latex_text
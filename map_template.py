@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import json
 import re
+from functools import lru_cache
 
 import config
 from design_constants import colors_for
@@ -10,6 +11,37 @@ from design_constants import colors_for
 LEAFLET_CSS_CDN = "https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"
 LEAFLET_JS_CDN = "https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"
 
+_MARKER_PLACEHOLDER = "__GVIM_MAP_MARKER__"
+
+_DEFAULT_MAP_SOURCE = (
+    "// Leaflet globals: L, map, tileLayer\n"
+    "const points = [\n"
+    "  [40.7484, -73.9857],\n"
+    "  [51.5072, -0.1276],\n"
+    "  [48.8566, 2.3522],\n"
+    "];\n"
+    "points.forEach(([lat, lon]) => {\n"
+    "  L.circleMarker([lat, lon], {\n"
+    "    radius: 5,\n"
+    f"    color: '{_MARKER_PLACEHOLDER}',\n"
+    f"    fillColor: '{_MARKER_PLACEHOLDER}',\n"
+    "    fillOpacity: 0.9,\n"
+    "  }).addTo(map);\n"
+    "});\n"
+    "const bounds = L.latLngBounds(points);\n"
+    "map.fitBounds(bounds.pad(0.2));\n"
+)
+
+
+def default_map_template(ui_mode: str | None = None) -> str:
+    return _map_template_for(ui_mode or config.get_ui_mode() or "dark")
+
+
+@lru_cache(maxsize=4)
+def _map_template_for(ui_mode: str) -> str:
+    palette = colors_for(ui_mode)
+    return _DEFAULT_MAP_SOURCE.replace(_MARKER_PLACEHOLDER, palette.map_marker)
+
 
 def render_map_html(source: str, ui_mode: str | None = None) -> str:
     palette = colors_for(ui_mode or config.get_ui_mode() or "dark")
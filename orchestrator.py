@@ -555,16 +555,13 @@ class Orchestrator:
     def _open_toc_drill(self) -> bool:
         if self._state.document is None or self._state.view is None:
             return False
-        toc_exists = any(
-            isinstance(block, TextBlock) and block.kind == "toc"
-            for block in self._state.document.blocks
-        )
-        if not toc_exists:
+        if self._state.document.toc_index is None:
             insert_at = self._state.view.get_selected_index()
-            self._state.document.insert_block_after(
-                insert_at, TextBlock("", kind="toc")
+            toc_block = TextBlock("", kind="toc")
+            self._state.document.insert_block_after(insert_at, toc_block)
+            self._state.view.insert_widget_after(
+                insert_at, toc_block, self._state.document
             )
-            self._state.view.set_document(self._state.document)
             self._persist_document()
         self._state.view.open_toc_drill(self._state.document)
         return True
@@ -676,8 +673,14 @@ class Orchestrator:
         return True
 
     def _handle_editor_update(self, index: int, kind: str, updated_text: str) -> None:
-        actions.update_block_from_editor(self._state, index, kind, updated_text)
-        self._persist_document()
+        changed = actions.update_block_from_editor(
+            self._state, index, kind, updated_text
+        )
+        # Re-saving an unchanged pyimage block still re-runs its render.
+        if not changed and kind != "pyimage":
+            return
+        if changed:
+            self._persist_document()
         if kind == "pyimage":
             if self._state.view is not None:
                 self._state.view.set_pyimage_pending(index)
@@ -687,7 +690,7 @@ class Orchestrator:
         if view is None:
             return
         if kind == "text":
-            view.update_text_at(index, updated_text)
+            view.refresh_block_at(index)
             document = self._state.document
             if document is None:
                 return
@@ -705,7 +708,7 @@ class Orchestrator:
             }:
                 view.refresh_toc(document)
             return
-        view.reload_media_at(index)
+        view.refresh_block_at(index)
 
     def _clear_editor(self) -> None:
         self._state.active_editor = None
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import sys
 from pathlib import Path
 
 from block_model import (
@@ -20,7 +21,7 @@ HEADER = "# GVIM v1"
 def load_document(path: Path) -> BlockDocument:
     raw = path.read_text(encoding="utf-8")
     blocks = _parse_blocks(raw)
-    doc = BlockDocument(blocks, path=path)
+    doc = BlockDocument(blocks, path=path, copy=False)
     doc.clear_dirty()
     return doc
 
@@ -79,7 +80,9 @@ def _parse_blocks(raw: str) -> list:
                 current_meta[key] = value.strip()
                 continue
             if current_type == "text" and key == "kind":
-                current_meta[key] = value.strip()
+                # Kinds are compared constantly; interning makes parsed kinds
+                # share identity with the literals used across the code.
+                current_meta[key] = sys.intern(value.strip())
                 continue
         current_lines.append(line)
 
@@ -87,29 +90,27 @@ def _parse_blocks(raw: str) -> list:
     return blocks
 
 
+_SECTION_TAGS = {
+    TextBlock: "text",
+    ThreeBlock: "three",
+    PythonImageBlock: "pyimage",
+    LatexBlock: "latex",
+    MapBlock: "map",
+}
+
+
 def _serialize_blocks(document: BlockDocument) -> str:
     parts = [HEADER]
     for block in document.blocks:
-        if isinstance(block, TextBlock):
-            parts.append("::text")
+        tag = _SECTION_TAGS.get(type(block))
+        if tag is None:
+            continue
+        parts.append(f"::{tag}")
+        if tag == "text":
             parts.append(f"kind: {block.kind}")
             parts.append(block.text.rstrip("\n"))
             continue
-        if isinstance(block, ThreeBlock):
-            parts.append("::three")
-            parts.append(block.source.rstrip("\n"))
-            continue
-        if isinstance(block, PythonImageBlock):
-            parts.append("::pyimage")
+        if tag == "pyimage":
             parts.append(f"format: {block.format}")
-            parts.append(block.source.rstrip("\n"))
-            continue
-        if isinstance(block, LatexBlock):
-            parts.append("::latex")
-            parts.append(block.source.rstrip("\n"))
-            continue
-        if isinstance(block, MapBlock):
-            parts.append("::map")
-            parts.append(block.source.rstrip("\n"))
-            continue
+        parts.append(block.source.rstrip("\n"))
     return "\n".join(parts).rstrip("\n") + "\n"
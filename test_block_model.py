@@ -0,0 +1,157 @@
+import dataclasses
+import random
+import sys
+import types
+import typing
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent
+
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from block_model import (
+    HEADING_LEVELS,
+    BlockDocument,
+    LatexBlock,
+    MapBlock,
+    PythonImageBlock,
+    TextBlock,
+    ThreeBlock,
+)
+
+
+BLOCK_TYPES = (TextBlock, ThreeBlock, PythonImageBlock, LatexBlock, MapBlock)
+IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None), tuple, frozenset)
+KINDS = ("title", "toc", "body", "h1", "h2", "h3", "h4", "h5", "h6")
+
+
+def _is_immutable_annotation(annotation: object) -> bool:
+    origin = typing.get_origin(annotation)
+    if origin in (typing.Union, types.UnionType):
+        return all(
+            _is_immutable_annotation(arg) for arg in typing.get_args(annotation)
+        )
+    if origin is not None:
+        return origin in (tuple, frozenset) and all(
+            arg is Ellipsis or _is_immutable_annotation(arg)
+            for arg in typing.get_args(annotation)
+        )
+    return annotation in IMMUTABLE_TYPES
+
+
+def _random_block(rng: random.Random):
+    if rng.random() < 0.75:
+        return TextBlock(rng.choice(["a", "b", ""]), kind=rng.choice(KINDS))
+    return rng.choice(
+        [ThreeBlock("scene"), LatexBlock("x^2"), MapBlock("map"), PythonImageBlock("p")]
+    )
+
+
+def _assert_indexes_match_rescan(document: BlockDocument) -> None:
+    blocks = document.blocks
+    tocs = [
+        index
+        for index, block in enumerate(blocks)
+        if isinstance(block, TextBlock) and block.kind == "toc"
+    ]
+    assert document.toc_index == (tocs[0] if tocs else None)
+    for index in range(-1, len(blocks) + 1):
+        expected = max(
+            [
+                HEADING_LEVELS.get(block.kind, 0)
+                for block in blocks[: max(index + 1, 0)]
+                if isinstance(block, TextBlock)
+            ],
+            default=0,
+        )
+        assert document.max_heading_level_through(index) == expected
+
+
+def test_blocks_are_frozen_with_immutable_fields() -> None:
+    for block_type in BLOCK_TYPES:
+        assert block_type.__dataclass_params__.frozen
+        hints = typing.get_type_hints(block_type)
+        for field in dataclasses.fields(block_type):
+            assert _is_immutable_annotation(hints[field.name]), (
+                f"{block_type.__name__}.{field.name} must be immutable"
+            )
+
+
+def test_frozen_block_rejects_assignment() -> None:
+    block = TextBlock("text")
+    try:
+        block.text = "changed"  # type: ignore[misc]
+    except dataclasses.FrozenInstanceError:
+        pass
+    else:
+        raise AssertionError("TextBlock accepted an attribute assignment")
+
+
+def test_remove_range_returns_removed_blocks_and_clamps() -> None:
+    blocks = [TextBlock(str(index)) for index in range(5)]
+    document = BlockDocument(blocks)
+
+    removed = document.remove_range(3, 10)
+
+    assert removed == blocks[3:]
+    assert document.blocks == blocks[:3]
+    assert document.dirty
+    assert document.remove_range(2, 1) == []
+
+
+def test_insert_blocks_after_places_blocks_after_index() -> None:
+    document = BlockDocument([TextBlock("a"), TextBlock("d")])
+    inserted = [TextBlock("b"), TextBlock("", kind="toc")]
+
+    document.insert_blocks_after(0, inserted)
+
+    assert [block.text for block in document.blocks] == ["a", "b", "", "d"]
+    assert document.toc_index == 2
+    document.insert_blocks_after(-1, [TextBlock("", kind="toc")])
+    assert document.toc_index == 0
+
+
+def test_set_source_reports_whether_anything_changed() -> None:
+    document = BlockDocument([TextBlock("same"), ThreeBlock("scene")])
+
+    assert not document.set_text_block(0, "same")
+    assert not document.set_three_block(1, "scene")
+    assert not document.dirty
+    assert not document.set_three_block(0, "scene")
+    assert not document.set_text_block(5, "x")
+
+    assert document.set_text_block(0, "changed")
+    assert document.dirty
+    assert document.blocks[0] == TextBlock("changed")
+
+
+def test_indexes_match_rescan_after_random_edits() -> None:
+    rng = random.Random(1234)
+    for _ in range(200):
+        blocks = [_random_block(rng) for _ in range(rng.randint(0, 8))]
+        document = BlockDocument(blocks)
+        _assert_indexes_match_rescan(document)
+        for _ in range(12):
+            size = len(document.blocks)
+            operation = rng.randrange(7)
+            if operation == 0:
+                document.append_block(_random_block(rng))
+            elif operation == 1:
+                document.insert_block_after(rng.randint(-1, size), _random_block(rng))
+            elif operation == 2:
+                document.insert_blocks_after(
+                    rng.randint(-1, size),
+                    [_random_block(rng) for _ in range(rng.randint(0, 3))],
+                )
+            elif operation == 3:
+                document.move_block(rng.randint(-1, size), rng.randint(-1, size))
+            elif operation == 4:
+                document.remove_block(rng.randint(-1, size))
+            elif operation == 5:
+                start = rng.randint(-1, size)
+                document.remove_range(start, start + rng.randint(-1, 3))
+            else:
+                document.set_text_block_kind(rng.randint(0, size), rng.choice(KINDS))
+            _assert_indexes_match_rescan(document)
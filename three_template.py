@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+from functools import lru_cache
 
 import config
 from design_constants import colors_for
@@ -9,7 +10,14 @@ from design_constants import colors_for
 def default_three_template(
     ui_mode: str | None = None, include_guidance: bool = True
 ) -> str:
-    palette = colors_for(ui_mode or config.get_ui_mode() or "dark")
+    return _three_template_for(
+        ui_mode or config.get_ui_mode() or "dark", include_guidance
+    )
+
+
+@lru_cache(maxsize=4)
+def _three_template_for(ui_mode: str, include_guidance: bool) -> str:
+    palette = colors_for(ui_mode)
     material_color = f"0x{palette.three_material:06x}"
     light_color = f"0x{palette.three_light:06x}"
     guidance = (
@@ -63,11 +71,15 @@ def default_three_template(
     return body
 
 
-def render_three_html(source: str, ui_mode: str | None = None) -> str:
+def render_three_html(
+    source: str,
+    ui_mode: str | None = None,
+    module_src: str = "__GVIM_THREE_SRC__",
+) -> str:
     palette = colors_for(ui_mode or config.get_ui_mode() or "dark")
     text_color = palette.webkit_three_text
     clear_color = f"0x{palette.three_clear:06x}"
-    src = "__GVIM_THREE_SRC__"
+    src = module_src
     js_source = json.dumps(source)
     return (
         "<!doctype html>\n"